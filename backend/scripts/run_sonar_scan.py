@@ -6,13 +6,107 @@ Handles the actual execution of Sonar Scanner with build wrapper.
 
 import os
 import sys
+import copy
 import subprocess
 import json
+import shlex
 import shutil
+import signal
+import tempfile
+import threading
+import time
+import uuid
 from datetime import datetime
 from pathlib import Path
 
 
+# Parsed config.json keyed by path -> (mtime, config), shared by all runners
+_CONFIG_CACHE = {}
+_config_cache_lock = threading.Lock()
+
+# Build files mapped to (build system, build command), in detection priority order
+_BUILD_FILES = {
+    'pom.xml': ('maven', 'mvn clean install'),
+    'build.gradle': ('gradle', './gradlew build'),
+    'build.gradle.kts': ('gradle', './gradlew build'),
+    'CMakeLists.txt': ('cmake', 'cmake . && make'),
+    'Makefile': ('make', 'make'),
+    'package.json': ('npm', 'npm install && npm run build'),
+    'setup.py': ('python', 'python setup.py build'),
+}
+_BUILD_FILE_NAMES = frozenset(_BUILD_FILES)
+
+# Directory under temp/ that workspaces are moved into while they are deleted
+TRASH_DIR_NAME = '.trash'
+
+
+def _read_config_file(config_path):
+    """Read a JSON config file, reusing the parsed result while its mtime is unchanged"""
+    key = str(config_path)
+    mtime = os.stat(key).st_mtime
+
+    with _config_cache_lock:
+        cached = _CONFIG_CACHE.get(key)
+        if cached is None or cached[0] != mtime:
+            with open(key, 'r') as f:
+                cached = (mtime, json.load(f))
+            _CONFIG_CACHE[key] = cached
+
+    return copy.deepcopy(cached[1])
+
+
+# Commands currently started by run_command, so they can be stopped on shutdown
+_running_processes = set()
+_process_lock = threading.Lock()
+_stopping = threading.Event()
+
+
+def terminate_running_commands(timeout=5):
+    """Stop every running command (SIGTERM, then SIGKILL) and refuse to start new ones"""
+    with _process_lock:
+        _stopping.set()
+        processes = list(_running_processes)
+
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        for process in processes:
+            try:
+                # Each command leads its own process group, which includes build tools it spawned
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            try:
+                process.wait(max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                pass
+
+        processes = [process for process in processes if process.poll() is None]
+        if not processes:
+            break
+
+
+def remove_tree_async(path):
+    """Delete a directory tree in the background without waiting for it"""
+    try:
+        # rm runs in its own session so it survives this script exiting
+        subprocess.Popen(
+            ['rm', '-rf', str(path)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+    except OSError:
+        threading.Thread(
+            target=shutil.rmtree,
+            args=(path,),
+            kwargs={'ignore_errors': True},
+            daemon=True
+        ).start()
+
+
 class SonarScanRunner:
     """Class to handle Sonar Scanner execution"""
 
@@ -20,9 +114,12 @@ class SonarScanRunner:
         self.repo_name = repo_name
         self.branch_name = branch_name
         self.release_version = release_version
+        self.project_key = repo_name.rsplit('/', 1)[-1].removesuffix('.git')
         self.project_root = Path(__file__).parent.parent.parent
         self.temp_dir = self.project_root / 'temp' / f"{repo_name}_{branch_name}_{int(datetime.now().timestamp())}"
         self.config = self._load_config()
+        self._scanner_args = self._build_scanner_args()
+        self._global_prereqs, self._system_prereqs = self._load_prerequisites()
 
     def _load_config(self):
         """Load configuration from config file"""
@@ -33,6 +130,7 @@ class SonarScanRunner:
             'workspace_dir': os.environ.get('WORKSPACE_DIR', str(self.project_root / 'temp')),
             'build_wrapper_cmd': 'build-wrapper-linux-x86-64',
             'sonar_scanner_cmd': 'sonar-scanner',
+            'clone_depth': None,
             'build_prerequisites': {
                 'global': [],
                 'maven': [],
@@ -46,14 +144,39 @@ class SonarScanRunner:
 
         if config_path.exists():
             try:
-                with open(config_path, 'r') as f:
-                    user_config = json.load(f)
-                    default_config.update(user_config)
+                default_config.update(_read_config_file(config_path))
             except Exception as e:
                 print(f"Warning: Could not load config file: {e}")
 
         return default_config
 
+    def _load_prerequisites(self):
+        """Resolve the configured prerequisite commands once per runner"""
+        prerequisites = self.config.get('build_prerequisites', {})
+        global_prereqs = tuple(prerequisites.get('global', []))
+        system_prereqs = {
+            system: tuple(prerequisites.get(system, []))
+            for system, _ in _BUILD_FILES.values()
+        }
+        return global_prereqs, system_prereqs
+
+    def _build_scanner_args(self):
+        """Build the sonar-scanner command line that does not depend on the build"""
+        scanner_args = [
+            self.config['sonar_scanner_cmd'],
+            f"-Dsonar.projectKey={self.project_key}",
+            f"-Dsonar.projectName={self.project_key}",
+            f"-Dsonar.projectVersion={self.release_version}",
+            "-Dsonar.sources=.",
+            f"-Dsonar.host.url={self.config['sonar_host_url']}",
+        ]
+
+        # Add token if available
+        if self.config['sonar_token']:
+            scanner_args.append(f"-Dsonar.login={self.config['sonar_token']}")
+
+        return scanner_args
+
     def print_step(self, message):
         """Print a step message"""
         print(f"\n{'='*60}")
@@ -64,19 +187,59 @@ class SonarScanRunner:
         """Run a shell command and stream output"""
         print(f"Executing: {command if isinstance(command, str) else ' '.join(command)}")
 
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            cwd=cwd,
-            shell=shell
-        )
+        with _process_lock:
+            if _stopping.is_set():
+                print("Error: Shutting down, command not started")
+                return 1
 
-        for line in iter(process.stdout.readline, ''):
-            if line:
-                print(line.rstrip())
+            process = subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=-1,
+                cwd=cwd,
+                shell=shell,
+                start_new_session=True
+            )
+            _running_processes.add(process)
 
+        try:
+            return self._stream_output(process)
+        finally:
+            with _process_lock:
+                _running_processes.discard(process)
+            # The command leads its own session, so a terminal Ctrl+C only reaches
+            # this process; take the command's group down with it
+            if process.poll() is None:
+                try:
+                    os.killpg(process.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def _stream_output(self, process):
+        """Forward a command's output to stdout and return its exit code"""
+        # Forward output in large blocks, writing only up to the last complete line
+        fd = process.stdout.fileno()
+        out = sys.stdout.buffer
+        pending = bytearray()
+        sys.stdout.flush()
+
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            pending += chunk
+            end = pending.rfind(b'\n') + 1
+            if end:
+                out.write(pending[:end])
+                out.flush()
+                del pending[:end]
+
+        if pending:
+            out.write(pending + b'\n')
+            out.flush()
+
+        process.stdout.close()
         process.wait()
         return process.returncode
 
@@ -115,8 +278,19 @@ class SonarScanRunner:
         # Create temp directory
         self.temp_dir.mkdir(parents=True, exist_ok=True)
 
-        # Clone repository
-        clone_cmd = ['git', 'clone', '--branch', self.branch_name, '--single-branch', self.repo_name, str(self.temp_dir)]
+        # Clone only the requested branch, without tags
+        clone_cmd = [
+            'git', '-c', 'protocol.version=2', 'clone',
+            '--single-branch', '--no-tags',
+            '--branch', self.branch_name,
+        ]
+
+        # A shallow clone is faster, but SonarQube then has no blame information
+        clone_depth = self.config.get('clone_depth')
+        if clone_depth:
+            clone_cmd.append(f"--depth={int(clone_depth)}")
+
+        clone_cmd += [self.repo_name, str(self.temp_dir)]
         returncode = self.run_command(clone_cmd)
 
         if returncode != 0:
@@ -130,18 +304,12 @@ class SonarScanRunner:
         """Detect the build system used in the project"""
         self.print_step("Detecting Build System")
 
-        build_files = {
-            'pom.xml': ('maven', 'mvn clean install'),
-            'build.gradle': ('gradle', './gradlew build'),
-            'build.gradle.kts': ('gradle', './gradlew build'),
-            'CMakeLists.txt': ('cmake', 'cmake . && make'),
-            'Makefile': ('make', 'make'),
-            'package.json': ('npm', 'npm install && npm run build'),
-            'setup.py': ('python', 'python setup.py build'),
-        }
+        # List the top-level directory once instead of probing each build file
+        with os.scandir(self.temp_dir) as entries:
+            found = {entry.name for entry in entries if entry.name in _BUILD_FILE_NAMES}
 
-        for build_file, (system, cmd) in build_files.items():
-            if (self.temp_dir / build_file).exists():
+        for build_file, (system, cmd) in _BUILD_FILES.items():
+            if build_file in found:
                 print(f"✓ Detected {system} project ({build_file})")
                 return system, cmd
 
@@ -153,13 +321,10 @@ class SonarScanRunner:
         if not build_system:
             return True
 
-        prerequisites = self.config.get('build_prerequisites', {})
-        global_prereqs = prerequisites.get('global', [])
-        system_prereqs = prerequisites.get(build_system, [])
-
-        all_prereqs = global_prereqs + system_prereqs
+        global_prereqs = self._global_prereqs
+        system_prereqs = self._system_prereqs.get(build_system, ())
 
-        if not all_prereqs:
+        if not global_prereqs and not system_prereqs:
             print("No prerequisite commands configured")
             return True
 
@@ -193,20 +358,26 @@ class SonarScanRunner:
         output_dir = self.temp_dir / 'bw-output'
 
         # Get prerequisite commands
-        prerequisites = self.config.get('build_prerequisites', {})
-        global_prereqs = prerequisites.get('global', [])
-        system_prereqs = prerequisites.get(build_system, []) if build_system else []
-        all_prereqs = global_prereqs + system_prereqs
+        all_prereqs = self._global_prereqs + self._system_prereqs.get(build_system, ())
+        wrapper_cmd = f"{self.config['build_wrapper_cmd']} --out-dir {shlex.quote(str(output_dir))} {build_command}"
 
-        # Build the full command chain to ensure prerequisites run in same terminal
+        # Write prerequisites and build into one script so they run in the same shell;
+        # 'set -e' stops at the first failing prerequisite
         if all_prereqs:
-            print(f"Including {len(all_prereqs)} prerequisite command(s) in build chain")
-            prereq_chain = ' && '.join(all_prereqs)
-            wrapper_cmd = f"{prereq_chain} && {self.config['build_wrapper_cmd']} --out-dir {output_dir} {build_command}"
-        else:
-            wrapper_cmd = f"{self.config['build_wrapper_cmd']} --out-dir {output_dir} {build_command}"
+            print(f"Including {len(all_prereqs)} prerequisite command(s) in build script")
 
-        returncode = self.run_command(wrapper_cmd, cwd=self.temp_dir, shell=True)
+        script_fd, script_path = tempfile.mkstemp(prefix='sonar-build-', suffix='.sh')
+        try:
+            with os.fdopen(script_fd, 'w') as script:
+                script.write('set -e\n')
+                for prereq_cmd in all_prereqs:
+                    script.write(f"{prereq_cmd}\n")
+                script.write(f"{wrapper_cmd}\n")
+
+            print(f"Build command: {wrapper_cmd}")
+            returncode = self.run_command(['/bin/sh', script_path], cwd=self.temp_dir)
+        finally:
+            os.unlink(script_path)
 
         if returncode != 0:
             print(f"Warning: Build wrapper returned non-zero exit code: {returncode}")
@@ -219,18 +390,7 @@ class SonarScanRunner:
         self.print_step("Running SonarQube Scanner")
 
         # Prepare sonar-scanner command
-        scanner_cmd = [
-            self.config['sonar_scanner_cmd'],
-            f"-Dsonar.projectKey={self.repo_name.split('/')[-1].replace('.git', '')}",
-            f"-Dsonar.projectName={self.repo_name.split('/')[-1].replace('.git', '')}",
-            f"-Dsonar.projectVersion={self.release_version}",
-            f"-Dsonar.sources=.",
-            f"-Dsonar.host.url={self.config['sonar_host_url']}",
-        ]
-
-        # Add token if available
-        if self.config['sonar_token']:
-            scanner_cmd.append(f"-Dsonar.login={self.config['sonar_token']}")
+        scanner_cmd = list(self._scanner_args)
 
         # Add build wrapper output if exists
         bw_output = self.temp_dir / 'bw-output'
@@ -252,8 +412,19 @@ class SonarScanRunner:
 
         try:
             if self.temp_dir.exists():
-                shutil.rmtree(self.temp_dir)
-                print(f"✓ Removed temporary directory: {self.temp_dir}")
+                # Move the directory aside so it can be deleted off the critical path
+                trash_root = self.project_root / 'temp' / TRASH_DIR_NAME
+                trash_root.mkdir(parents=True, exist_ok=True)
+                trash_dir = trash_root / uuid.uuid4().hex
+                try:
+                    self.temp_dir.rename(trash_dir)
+                except OSError:
+                    # e.g. EXDEV when the workspace is on another filesystem
+                    shutil.rmtree(self.temp_dir)
+                    print(f"✓ Removed temporary directory: {self.temp_dir}")
+                else:
+                    remove_tree_async(trash_dir)
+                    print(f"✓ Queued temporary directory for removal: {self.temp_dir}")
         except Exception as e:
             print(f"Warning: Could not remove temporary directory: {e}")
 
@@ -7,17 +7,33 @@ A simple HTTP server to handle Sonar Scanner execution requests.
 import os
 import sys
 import json
+import base64
+import shutil
+import signal
 import logging
-import subprocess
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 from datetime import datetime
 import time
 
+# Optional C JSON encoder; the standard library is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+import run_sonar_scan  # noqa: E402
+
 # Configure logging
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
+SCAN_LOG_DIR = os.path.join(LOG_DIR, 'scans')
+os.makedirs(SCAN_LOG_DIR, exist_ok=True)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -29,23 +45,251 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Workspace used by the scan script for repository clones
+TEMP_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'temp')
+
+# Web interface entry page, kept in memory as (mtime, content) once read
+INDEX_PATH = os.path.join(os.path.dirname(__file__), '../frontend/index.html')
+_index_cache = None
+
+# API responses are compact UTF-8 JSON
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+if orjson is not None:
+    def _json_dumps(obj):
+        """Encode obj as compact UTF-8 JSON, using the json module for what orjson rejects"""
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. integers beyond 64 bits
+            return _json_encoder.encode(obj).encode('utf-8')
+else:
+    def _json_dumps(obj):
+        """Encode obj as compact UTF-8 JSON"""
+        return _json_encoder.encode(obj).encode('utf-8')
+
+# Browser cache lifetime for files under /static/
+STATIC_CACHE_CONTROL = 'public, max-age=3600'
+
+# Content types for static files, keyed by lower-case extension
+MIME_TYPES = {
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.map': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon',
+    '.woff2': 'font/woff2',
+}
+
+# Finished scans kept for result polling: at most MAX_SCANS, each for SCAN_RESULT_TTL seconds
+MAX_SCANS = 1024
+SCAN_RESULT_TTL = 3600
+SCAN_REAP_INTERVAL = 60
+
+# Scans waiting for a free executor thread are 'queued' until they start running
+UNFINISHED_STATUSES = ('queued', 'running')
+
+
+class _ScanRegistry(OrderedDict):
+    """Scan table that forgets its oldest finished scan once it holds more than MAX_SCANS"""
+
+    def __init__(self):
+        super().__init__()
+        # Log files of forgotten scans, removed by the caller outside scan_lock
+        self.evicted_log_paths = []
+
+    def __setitem__(self, scan_id, scan):
+        super().__setitem__(scan_id, scan)
+        if len(self) > MAX_SCANS:
+            for old_id, old_scan in self.items():
+                if old_scan['status'] not in UNFINISHED_STATUSES:
+                    self.evicted_log_paths.append(old_scan['log_path'])
+                    del self[old_id]
+                    break
+
+    def take_evicted_log_paths(self):
+        """Return and clear the log files of scans forgotten so far"""
+        paths, self.evicted_log_paths = self.evicted_log_paths, []
+        return paths
+
+
 # Global variable to store active scans
-active_scans = {}
+active_scans = _ScanRegistry()
 scan_lock = threading.Lock()
 
+# Notified whenever a scan gains output or changes status (used for long polling)
+scan_update = threading.Condition(scan_lock)
+
+# Upper bound for the wait_ms long-poll parameter of /api/scan/<id>
+MAX_POLL_WAIT_MS = 30000
+
+# Scans run in-process on a shared pool instead of one Python subprocess each.
+# Pool threads are joined at exit, so run_server stops running scan commands on shutdown.
+scan_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='scan')
+
+# Per-thread output sink used while a scan runs (see _ThreadOutputRouter)
+_thread_output = threading.local()
+
+# Number of output lines kept in memory per scan; older lines are dropped
+MAX_OUTPUT_LINES = 10_000
+
+# Maximum number of bytes returned by a single scan log request
+MAX_LOG_READ = 1024 * 1024
+
+
+# Current time as (epoch second, ISO string); reformatted at most once per second
+_now_cache = (0, '')
+
+
+def _now_iso():
+    """Return the current local time in ISO format, to the second"""
+    global _now_cache
+    second = int(time.time())
+    cached = _now_cache
+    if cached[0] != second:
+        cached = (second, datetime.fromtimestamp(second).isoformat())
+        _now_cache = cached
+    return cached[1]
+
+
+# Encoded /api/status body as (active scan count, timestamp, body)
+_status_cache = (None, '', b'')
+
+
+def _status_body():
+    """Return the /api/status body, encoding it only when the count or second changes"""
+    global _status_cache
+    count = len(active_scans)
+    timestamp = _now_iso()
+    cached = _status_cache
+    if cached[0] != count or cached[1] != timestamp:
+        # Fixed-shape payload, so format it directly instead of going through the encoder
+        body = b'{"status":"running","timestamp":"%s","active_scans":%d}' % (timestamp.encode(), count)
+        cached = (count, timestamp, body)
+        _status_cache = cached
+    return cached[2]
+
+
+def _read_index():
+    """Return the content of index.html, re-reading it only when its mtime changes"""
+    global _index_cache
+    mtime = os.stat(INDEX_PATH).st_mtime
+    cached = _index_cache
+    if cached is None or cached[0] != mtime:
+        with open(INDEX_PATH, 'rb') as f:
+            cached = (mtime, f.read())
+        _index_cache = cached
+    return cached[1]
+
+
+def _scan_log_path(scan_id):
+    """Return the path of the full output log for a scan"""
+    return os.path.join(SCAN_LOG_DIR, f"{scan_id}.log")
+
+
+def _append_output(scan_id, lines, nbytes=0):
+    """Append a batch of output lines to a scan under a single lock acquisition"""
+    with scan_lock:
+        scan = active_scans[scan_id]
+        scan['output'].extend(lines)
+        scan['output_seq'] += len(lines)
+        scan['bytes_written'] += nbytes
+        scan_update.notify_all()
+
+
+class _ScanOutput:
+    """Writable stream that records a scan's output in its log file and in active_scans"""
+
+    def __init__(self, scan_id, log_fd):
+        self.scan_id = scan_id
+        self.log_fd = log_fd
+        self._pending = bytearray()
+
+    def write(self, data):
+        """Accept text or bytes, recording every complete line in one batch"""
+        if isinstance(data, str):
+            data = data.encode('utf-8', 'replace')
+        self._pending += data
+        end = self._pending.rfind(b'\n') + 1
+        if end:
+            self._record(bytes(self._pending[:end]))
+            del self._pending[:end]
+        return len(data)
+
+    def flush(self):
+        """Partial lines are kept until their newline arrives"""
+
+    def close(self):
+        """Record any trailing output that did not end with a newline"""
+        if self._pending:
+            self._record(bytes(self._pending) + b'\n')
+            self._pending.clear()
+
+    def _record(self, data):
+        os.write(self.log_fd, data)
+        lines = data.decode('utf-8', 'replace').splitlines()
+        _append_output(self.scan_id, lines, len(data))
+        for line in lines:
+            logger.info(f"[{self.scan_id}] {line}")
+
+
+class _ThreadOutputRouter:
+    """Stand-in for sys.stdout/sys.stderr that sends a scan thread's output to its _ScanOutput"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def _target(self):
+        sink = getattr(_thread_output, 'sink', None)
+        return self._stream if sink is None else sink
+
+    @property
+    def buffer(self):
+        sink = getattr(_thread_output, 'sink', None)
+        return self._stream.buffer if sink is None else sink
+
+    def write(self, data):
+        return self._target().write(data)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
 
 class SonarScannerHandler(BaseHTTPRequestHandler):
     """HTTP Request Handler for Sonar Scanner operations"""
 
-    def _set_headers(self, content_type='text/html', status=200):
+    # Keep connections open between requests from polling clients
+    protocol_version = 'HTTP/1.1'
+
+    def _set_headers(self, content_type='text/html', status=200, content_length=0, cache_control=None):
         """Set HTTP response headers"""
         self.send_response(status)
         self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(content_length))
+        if cache_control:
+            self.send_header('Cache-Control', cache_control)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
 
+    def _send_body(self, body, content_type='text/html', status=200):
+        """Send a complete response with the given body"""
+        self._set_headers(content_type, status, len(body))
+        self.wfile.write(body)
+
+    def _send_json(self, response, status=200):
+        """Send a JSON response"""
+        self._send_body(_json_dumps(response), JSON_CONTENT_TYPE, status)
+
     def do_OPTIONS(self):
         """Handle OPTIONS requests for CORS"""
         self._set_headers()
@@ -56,94 +300,173 @@ class SonarScannerHandler(BaseHTTPRequestHandler):
         path = parsed_path.path
 
         if path == '/' or path == '/index.html':
-            self._serve_file('../frontend/index.html', 'text/html')
+            self._serve_index()
         elif path.startswith('/static/'):
             self._serve_static_file(path)
         elif path == '/api/status':
             self._handle_status()
         elif path.startswith('/api/scan/'):
             scan_id = path.replace('/api/scan/', '')
-            self._handle_scan_result(scan_id)
+            self._handle_scan_result(scan_id, parse_qs(parsed_path.query))
+        elif path.startswith('/api/logs/'):
+            scan_id = path.replace('/api/logs/', '')
+            self._handle_scan_log(scan_id, parse_qs(parsed_path.query))
         else:
-            self._set_headers(status=404)
-            self.wfile.write(b'404 - Not Found')
+            self._send_body(b'404 - Not Found', status=404)
 
     def do_POST(self):
         """Handle POST requests"""
         if self.path == '/api/scan':
             self._handle_scan()
         else:
-            self._set_headers(status=404)
-            self.wfile.write(b'404 - Not Found')
+            # The request body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            self._send_body(b'404 - Not Found', status=404)
+
+    def _serve_index(self):
+        """Serve the web interface entry page from memory"""
+        try:
+            self._send_body(_read_index(), 'text/html')
+        except FileNotFoundError:
+            self._send_body(b'404 - File Not Found', status=404)
+        except Exception as e:
+            logger.error(f"Error serving index page: {e}")
+            self._send_body(b'500 - Internal Server Error', status=500)
 
-    def _serve_file(self, filepath, content_type):
+    def _serve_file(self, filepath, content_type, cache_control=None):
         """Serve a file from the filesystem"""
+        headers_sent = False
         try:
             full_path = os.path.join(os.path.dirname(__file__), filepath)
             with open(full_path, 'rb') as f:
-                content = f.read()
-            self._set_headers(content_type)
-            self.wfile.write(content)
+                size = os.fstat(f.fileno()).st_size
+                self._set_headers(content_type, content_length=size, cache_control=cache_control)
+                headers_sent = True
+                # Copies in the kernel via os.sendfile() where available
+                self.connection.sendfile(f, 0, size)
         except FileNotFoundError:
-            self._set_headers(status=404)
-            self.wfile.write(b'404 - File Not Found')
+            self._send_body(b'404 - File Not Found', status=404)
         except Exception as e:
             logger.error(f"Error serving file {filepath}: {e}")
-            self._set_headers(status=500)
-            self.wfile.write(b'500 - Internal Server Error')
+            if headers_sent:
+                # The body is incomplete, so a second response would corrupt the stream
+                self.close_connection = True
+            else:
+                self._send_body(b'500 - Internal Server Error', status=500)
 
     def _serve_static_file(self, path):
         """Serve static files (CSS, JS)"""
         file_path = path.replace('/static/', '../frontend/static/')
+        extension = os.path.splitext(path)[1].lower()
+        content_type = MIME_TYPES.get(extension, 'text/plain')
 
-        if path.endswith('.css'):
-            content_type = 'text/css'
-        elif path.endswith('.js'):
-            content_type = 'application/javascript'
-        elif path.endswith('.png'):
-            content_type = 'image/png'
-        elif path.endswith('.jpg') or path.endswith('.jpeg'):
-            content_type = 'image/jpeg'
-        else:
-            content_type = 'text/plain'
-
-        self._serve_file(file_path, content_type)
+        self._serve_file(file_path, content_type, STATIC_CACHE_CONTROL)
 
     def _handle_status(self):
         """Handle status check requests"""
-        self._set_headers('application/json')
-        response = {
-            'status': 'running',
-            'timestamp': datetime.now().isoformat(),
-            'active_scans': len(active_scans)
-        }
-        self.wfile.write(json.dumps(response).encode())
+        self._send_body(_status_body(), JSON_CONTENT_TYPE)
+
+    def _handle_scan_result(self, scan_id, query):
+        """Handle scan result retrieval requests
+
+        Only output lines after the first N (?since=N) are returned. With
+        ?wait_ms=T the request is held for up to T milliseconds until the scan
+        has more than N output lines, changes status or is no longer running.
+        """
+        try:
+            since = int(query.get('since', ['0'])[0])
+            wait_ms = min(int(query.get('wait_ms', ['0'])[0]), MAX_POLL_WAIT_MS)
+            if since < 0:
+                raise ValueError(since)
+        except ValueError:
+            self._send_error_response('Invalid since or wait_ms')
+            return
+
+        def has_update():
+            scan = active_scans.get(scan_id)
+            return (scan is None or scan['output_seq'] > since or scan['status'] != seen_status
+                    or scan['status'] not in UNFINISHED_STATUSES)
 
-    def _handle_scan_result(self, scan_id):
-        """Handle scan result retrieval requests"""
         with scan_lock:
-            if scan_id not in active_scans:
-                self._set_headers('application/json', status=404)
+            # A client cannot have seen more lines than the scan has produced
+            scan_data = active_scans.get(scan_id)
+            seen_status = None
+            if scan_data is not None:
+                since = min(since, scan_data['output_seq'])
+                seen_status = scan_data['status']
+
+            if wait_ms > 0:
+                scan_update.wait_for(has_update, wait_ms / 1000)
+
+            # Copy only the fields the response needs, plus the new tail of the output
+            response = None
+            scan_data = active_scans.get(scan_id)
+            if scan_data is not None:
+                output = scan_data['output']
+                output_seq = scan_data['output_seq']
+                first = max(since, output_seq - len(output))
+                # Walk back from the newest line so the cost is the size of the delta
+                new_lines = list(islice(reversed(output), max(0, output_seq - first)))
+                new_lines.reverse()
                 response = {
-                    'status': 'error',
-                    'message': f'Scan ID {scan_id} not found'
+                    'status': 'success',
+                    'scan_id': scan_id,
+                    'scan_status': scan_data['status'],
+                    'output': new_lines,
+                    'output_offset': first,
+                    'next_offset': output_seq,
+                    'start_time': scan_data.get('start_time'),
+                    'end_time': scan_data.get('end_time'),
+                    'return_code': scan_data.get('return_code')
                 }
-                self.wfile.write(json.dumps(response).encode())
-                return
 
-            scan_data = active_scans[scan_id].copy()
+        if response is None:
+            self._send_scan_not_found(scan_id)
+            return
+
+        self._send_json(response)
+
+    def _handle_scan_log(self, scan_id, query):
+        """Handle full scan log retrieval requests, starting at a byte offset"""
+        try:
+            offset = int(query.get('offset', ['0'])[0])
+            if offset < 0:
+                raise ValueError(offset)
+        except ValueError:
+            self._send_error_response('Invalid offset')
+            return
+
+        with scan_lock:
+            scan_data = active_scans.get(scan_id)
+            if scan_data is not None:
+                log_path = scan_data['log_path']
+                bytes_written = scan_data['bytes_written']
+
+        if scan_data is None:
+            self._send_scan_not_found(scan_id)
+            return
+
+        data = b''
+        if offset < bytes_written:
+            try:
+                fd = os.open(log_path, os.O_RDONLY)
+            except FileNotFoundError:
+                # The scan was forgotten and its log removed since the lookup above
+                self._send_scan_not_found(scan_id)
+                return
+            try:
+                data = os.pread(fd, min(MAX_LOG_READ, bytes_written - offset), offset)
+            finally:
+                os.close(fd)
 
-        self._set_headers('application/json')
         response = {
             'status': 'success',
             'scan_id': scan_id,
-            'scan_status': scan_data['status'],
-            'output': scan_data['output'],
-            'start_time': scan_data.get('start_time'),
-            'end_time': scan_data.get('end_time'),
-            'return_code': scan_data.get('return_code')
+            'bytes': base64.b64encode(data).decode('ascii'),
+            'next_offset': offset + len(data),
+            'bytes_written': bytes_written
         }
-        self.wfile.write(json.dumps(response).encode())
+        self._send_json(response)
 
     def _handle_scan(self):
         """Handle scan execution requests"""
@@ -161,24 +484,32 @@ class SonarScannerHandler(BaseHTTPRequestHandler):
                 self._send_error_response('All fields are required')
                 return
 
-            # Generate scan ID
-            scan_id = f"{repo_name}_{branch_name}_{int(time.time())}"
+            # Generate a short, URL- and filename-safe scan ID
+            scan_id = base64.urlsafe_b64encode(os.urandom(9)).decode('ascii')
 
-            # Start scan in background thread
-            scan_thread = threading.Thread(
-                target=self._execute_scan,
-                args=(scan_id, repo_name, branch_name, release_version)
-            )
-            scan_thread.daemon = True
-            scan_thread.start()
+            # Register the scan before queueing it so it can be polled right away
+            with scan_lock:
+                active_scans[scan_id] = {
+                    'status': 'queued',
+                    'repo': repo_name,
+                    'branch': branch_name,
+                    'output': deque(maxlen=MAX_OUTPUT_LINES),
+                    'output_seq': 0,
+                    'log_path': _scan_log_path(scan_id),
+                    'bytes_written': 0,
+                    'start_time': None
+                }
+                evicted_logs = active_scans.take_evicted_log_paths()
+
+            _remove_scan_logs(evicted_logs)
+            scan_executor.submit(self._execute_scan, scan_id, repo_name, branch_name, release_version)
 
-            self._set_headers('application/json')
             response = {
                 'status': 'success',
                 'message': 'Scan started successfully',
                 'scan_id': scan_id
             }
-            self.wfile.write(json.dumps(response).encode())
+            self._send_json(response)
 
         except json.JSONDecodeError:
             self._send_error_response('Invalid JSON data')
@@ -186,69 +517,146 @@ class SonarScannerHandler(BaseHTTPRequestHandler):
             logger.error(f"Error handling scan request: {e}")
             self._send_error_response(f'Internal server error: {str(e)}')
 
+    def _send_scan_not_found(self, scan_id):
+        """Send a 404 response for an unknown scan ID"""
+        response = {
+            'status': 'error',
+            'message': f'Scan ID {scan_id} not found'
+        }
+        self._send_json(response, status=404)
+
     def _send_error_response(self, message):
         """Send an error response"""
-        self._set_headers('application/json', status=400)
         response = {
             'status': 'error',
             'message': message
         }
-        self.wfile.write(json.dumps(response).encode())
+        self._send_json(response, status=400)
 
     def _execute_scan(self, scan_id, repo_name, branch_name, release_version):
         """Execute the Sonar Scanner scan"""
         with scan_lock:
-            active_scans[scan_id] = {
-                'status': 'running',
-                'output': [],
-                'start_time': datetime.now().isoformat()
-            }
+            scan = active_scans[scan_id]
+            scan['status'] = 'running'
+            scan['start_time'] = _now_iso()
+            log_path = scan['log_path']
+            scan_update.notify_all()
 
+        log_fd = None
         try:
-            logger.info(f"Starting scan {scan_id} for {repo_name}/{branch_name} v{release_version}")
+            # The full output goes to disk; only the most recent lines stay in memory
+            log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
 
-            # Call the scan script
-            script_path = os.path.join(os.path.dirname(__file__), 'scripts', 'run_sonar_scan.py')
-
-            process = subprocess.Popen(
-                [sys.executable, script_path, repo_name, branch_name, release_version],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
-            )
-
-            # Capture output line by line
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    with scan_lock:
-                        active_scans[scan_id]['output'].append(line.strip())
-                    logger.info(f"[{scan_id}] {line.strip()}")
+            logger.info(f"Starting scan {scan_id} for {repo_name}/{branch_name} v{release_version}")
 
-            process.wait()
+            # Run the scan in this thread, capturing everything it prints
+            output = _ScanOutput(scan_id, log_fd)
+            _thread_output.sink = output
+            try:
+                runner = run_sonar_scan.SonarScanRunner(repo_name, branch_name, release_version)
+                returncode = runner.run()
+            finally:
+                _thread_output.sink = None
+                output.close()
 
             with scan_lock:
-                active_scans[scan_id]['status'] = 'completed' if process.returncode == 0 else 'failed'
-                active_scans[scan_id]['return_code'] = process.returncode
-                active_scans[scan_id]['end_time'] = datetime.now().isoformat()
+                active_scans[scan_id]['status'] = 'completed' if returncode == 0 else 'failed'
+                active_scans[scan_id]['return_code'] = returncode
+                active_scans[scan_id]['end_time'] = _now_iso()
+                active_scans[scan_id]['finished_at'] = time.monotonic()
+                scan_update.notify_all()
 
-            logger.info(f"Scan {scan_id} completed with return code {process.returncode}")
+            logger.info(f"Scan {scan_id} completed with return code {returncode}")
 
         except Exception as e:
             logger.error(f"Error executing scan {scan_id}: {e}")
+            error_line = f"Error: {str(e)}"
+            nbytes = 0
+            if log_fd is not None:
+                # Best effort: the log write may be what failed (e.g. disk full)
+                try:
+                    nbytes = os.write(log_fd, f"{error_line}\n".encode())
+                except OSError:
+                    pass
             with scan_lock:
-                active_scans[scan_id]['status'] = 'error'
-                active_scans[scan_id]['output'].append(f"Error: {str(e)}")
+                scan = active_scans[scan_id]
+                scan['status'] = 'error'
+                scan['end_time'] = _now_iso()
+                scan['finished_at'] = time.monotonic()
+                scan['output'].append(error_line)
+                scan['output_seq'] += 1
+                scan['bytes_written'] += nbytes
+                scan_update.notify_all()
+
+        finally:
+            if log_fd is not None:
+                os.close(log_fd)
 
     def log_message(self, format, *args):
         """Override to use custom logger"""
         logger.info(f"{self.client_address[0]} - {format % args}")
 
 
+def _sweep_trash_dirs():
+    """Remove workspaces left in temp/.trash by background removals that did not finish"""
+    trash_root = os.path.join(TEMP_DIR, run_sonar_scan.TRASH_DIR_NAME)
+    try:
+        entries = list(os.scandir(trash_root))
+    except FileNotFoundError:
+        return
+
+    for entry in entries:
+        shutil.rmtree(entry.path, ignore_errors=True)
+        logger.info(f"Removed leftover temporary directory: {entry.path}")
+
+
+def _remove_scan_logs(paths):
+    """Delete the log files of scans that are no longer tracked"""
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove scan log {path}: {e}")
+
+
+def _reap_expired_scans():
+    """Periodically drop finished scans older than SCAN_RESULT_TTL"""
+    while True:
+        time.sleep(SCAN_REAP_INTERVAL)
+        cutoff = time.monotonic() - SCAN_RESULT_TTL
+        with scan_lock:
+            expired = [
+                scan_id for scan_id, scan in active_scans.items()
+                if scan.get('finished_at') is not None and scan['finished_at'] < cutoff
+            ]
+            expired_logs = [active_scans.pop(scan_id)['log_path'] for scan_id in expired]
+
+        if expired:
+            _remove_scan_logs(expired_logs)
+            logger.info(f"Dropped {len(expired)} expired scan result(s)")
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    """Signal handler that stops serve_forever like Ctrl+C does"""
+    raise KeyboardInterrupt
+
+
 def run_server(host='0.0.0.0', port=8080):
     """Start the HTTP server"""
+    threading.Thread(target=_sweep_trash_dirs, daemon=True).start()
+    threading.Thread(target=_reap_expired_scans, daemon=True).start()
+
+    # Scans print to stdout/stderr; route that output per scan thread
+    sys.stdout = _ThreadOutputRouter(sys.stdout)
+    sys.stderr = _ThreadOutputRouter(sys.stderr)
+
+    # Treat 'kill <pid>' like Ctrl+C so running scans are stopped too
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+
     server_address = (host, port)
-    httpd = HTTPServer(server_address, SonarScannerHandler)
+    httpd = ThreadingHTTPServer(server_address, SonarScannerHandler)
 
     logger.info(f"Starting Sonar Scanner Server on http://{host}:{port}")
     logger.info(f"Access the web interface at http://localhost:{port}")
@@ -259,6 +667,10 @@ def run_server(host='0.0.0.0', port=8080):
     except KeyboardInterrupt:
         logger.info("\nShutting down server...")
         httpd.shutdown()
+        # Drop queued scans and stop the commands of running ones, so their
+        # threads finish (with cleanup) instead of blocking interpreter exit
+        scan_executor.shutdown(wait=False, cancel_futures=True)
+        run_sonar_scan.terminate_running_commands()
         logger.info("Server stopped.")
 
 
@@ -6,7 +6,7 @@
 const state = {
     isScanning: false,
     scanId: null,
-    pollInterval: null
+    pollTimer: null
 };
 
 // DOM Elements
@@ -124,53 +124,65 @@ async function handleSubmit(e) {
 
 /**
  * Poll for scan progress from the backend
+ *
+ * The server holds each request until new output arrives (long polling),
+ * so the next poll is issued as soon as the previous one returns.
  */
 let lastOutputLength = 0;
+const POLL_WAIT_MS = 5000;
+const POLL_RETRY_MS = 1000;
 
 async function pollScanProgress() {
+    state.pollTimer = null;
     if (!state.scanId) {
         return;
     }
 
+    const scanId = state.scanId;
+    let nextPollDelay = POLL_RETRY_MS;
+
     try {
-        const response = await fetch(`/api/scan/${state.scanId}`);
+        const response = await fetch(`/api/scan/${scanId}?since=${lastOutputLength}&wait_ms=${POLL_WAIT_MS}`);
         const result = await response.json();
 
+        // Output was cleared while this request was pending
+        if (state.scanId !== scanId) {
+            return;
+        }
+
         if (response.ok && result.status === 'success') {
             const scanStatus = result.scan_status;
             const output = result.output || [];
+            const offset = result.output_offset || 0;
+            const total = offset + output.length;
 
-            // Append new output lines
-            if (output.length > lastOutputLength) {
-                for (let i = lastOutputLength; i < output.length; i++) {
-                    appendOutput(output[i]);
+            // Append new output lines (the server only keeps the most recent ones)
+            if (total > lastOutputLength) {
+                for (let i = Math.max(lastOutputLength, offset); i < total; i++) {
+                    appendOutput(output[i - offset]);
                 }
-                lastOutputLength = output.length;
+                lastOutputLength = total;
             }
 
             // Check if scan is complete
             if (scanStatus === 'completed') {
-                clearInterval(state.pollInterval);
                 completeScan(true);
                 lastOutputLength = 0;
+                return;
             } else if (scanStatus === 'failed' || scanStatus === 'error') {
-                clearInterval(state.pollInterval);
                 completeScan(false);
                 lastOutputLength = 0;
-            } else {
-                // Continue polling
-                if (!state.pollInterval) {
-                    state.pollInterval = setInterval(pollScanProgress, 1000);
-                }
+                return;
             }
+
+            nextPollDelay = 0;
         }
     } catch (error) {
         console.error('Error polling scan progress:', error);
         // Continue polling even on error
-        if (!state.pollInterval) {
-            state.pollInterval = setInterval(pollScanProgress, 1000);
-        }
     }
+
+    state.pollTimer = setTimeout(pollScanProgress, nextPollDelay);
 }
 
 /**
@@ -209,10 +221,10 @@ function handleClear() {
  * Handle clear output button
  */
 function handleClearOutput() {
-    // Clear polling interval if exists
-    if (state.pollInterval) {
-        clearInterval(state.pollInterval);
-        state.pollInterval = null;
+    // Cancel the next scheduled poll if exists
+    if (state.pollTimer) {
+        clearTimeout(state.pollTimer);
+        state.pollTimer = null;
     }
 
     // Reset state